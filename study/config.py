@@ -7,3 +7,33 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
 
 TAVILY_API_KEY=os.getenv("TAVILY_API_KEY")
+
+
+def _env_int(name: str, default: int) -> int:
+    """读取整数环境变量；为空或格式错误时回退到默认值并打印警告，不阻止服务启动"""
+    raw = os.getenv(name, "").strip()
+    if not raw:
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        print(f"⚠️ 环境变量 {name}={raw!r} 不是整数，使用默认值 {default}")
+        return default
+
+
+# -------------------------
+# 热门主题预热（后台缓存诊断/资源阶段结果）
+# -------------------------
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "false").lower() in ("1", "true", "yes")
+# 每轮预热的热门 (subject, goal, current_level) 数量
+WARMUP_TOP_N = _env_int("WARMUP_TOP_N", 20)
+# 调度器检查间隔（秒）
+WARMUP_INTERVAL_SECONDS = _env_int("WARMUP_INTERVAL_SECONDS", 300)
+# 低峰时段，格式 "HH:MM-HH:MM"，多个用逗号分隔，支持跨零点，例如 "01:00-06:00,13:00-14:00"
+WARMUP_WINDOWS = os.getenv("WARMUP_WINDOWS", "01:00-06:00")
+# 每小时最多预热多少个 key（速率预算）
+WARMUP_MAX_RUNS_PER_HOUR = _env_int("WARMUP_MAX_RUNS_PER_HOUR", 30)
+# 每天预热可消耗的 token 上限（token 预算）
+WARMUP_DAILY_TOKEN_BUDGET = _env_int("WARMUP_DAILY_TOKEN_BUDGET", 500000)
+# 诊断/资源阶段缓存有效期（秒），过期后由预热刷新或由实时请求重新计算
+STAGE_CACHE_TTL_SECONDS = _env_int("STAGE_CACHE_TTL_SECONDS", 86400)
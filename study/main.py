@@ -1,12 +1,51 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .study_planner_agent import get_study_planner_agent
 from .schemas import StudyRequest, StudyPlanResponse
+from .warmup import WarmupScheduler
+from .config import (
+    WARMUP_ENABLED,
+    WARMUP_TOP_N,
+    WARMUP_INTERVAL_SECONDS,
+    WARMUP_WINDOWS,
+    WARMUP_MAX_RUNS_PER_HOUR,
+    WARMUP_DAILY_TOKEN_BUDGET,
+    STAGE_CACHE_TTL_SECONDS,
+)
 import uvicorn
 
+planner = get_study_planner_agent()
+
+warmup = None
+if WARMUP_ENABLED:
+    try:
+        warmup = WarmupScheduler(
+            planner,
+            top_n=WARMUP_TOP_N,
+            interval_seconds=WARMUP_INTERVAL_SECONDS,
+            windows=WARMUP_WINDOWS,
+            max_runs_per_hour=WARMUP_MAX_RUNS_PER_HOUR,
+            daily_token_budget=WARMUP_DAILY_TOKEN_BUDGET,
+        )
+    except ValueError as e:
+        print(f"⚠️ 预热配置无效，已禁用预热: {e}")
+    else:
+        # 缓存只需容纳 Top-N 热门 key，留一倍余量应对排名变化
+        planner.enable_stage_cache(STAGE_CACHE_TTL_SECONDS, max_entries=WARMUP_TOP_N * 2)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if warmup is not None:
+        warmup.start()
+    yield
+    if warmup is not None:
+        await warmup.stop()
+
 app = FastAPI(
     title="AI 学习规划助手",
-    version="1.0"
+    version="1.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -17,16 +56,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-planner = get_study_planner_agent()
-
 @app.post("/api/v1/study/plan", response_model=StudyPlanResponse)
-async def plan_learning(request: StudyRequest):
+async def plan_learning(request: StudyRequest, compact: bool = False):
+    if warmup is not None:
+        warmup.record(request)
+        warmup.live_started()
     try:
         await planner.initialize()
         plan = await planner.plan_study(request)
+        if compact:
+            # 精简模式：去掉与请求内容重复的 learner_profile/time_plan 回显
+            plan = plan.model_copy(update={"learner_profile": None, "time_plan": None})
         return StudyPlanResponse(success=True, message="规划成功", data=plan)
     except Exception as e:
         return StudyPlanResponse(success=False, message=str(e))
+    finally:
+        if warmup is not None:
+            warmup.live_finished()
     
 @app.get("/")
 async def root():
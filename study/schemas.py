@@ -38,9 +38,9 @@ class DailyPlan(BaseModel):
 class StudyPlan(BaseModel):
     subject: str
     goal: str
-    learner_profile: Dict[str, Any]
+    learner_profile: Optional[Dict[str, Any]] = Field(default=None, description="学习者画像（精简响应时为空）")
     diagnosis: Dict[str, Any]
-    time_plan: Dict[str, Any]
+    time_plan: Optional[Dict[str, Any]] = Field(default=None, description="时间安排（精简响应时为空）")
     recommended_resources: List[ResourceItem]
     daily_plans: List[DailyPlan]
     milestones: List[str]
@@ -1,6 +1,6 @@
 import json
 import asyncio
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from pydantic import BaseModel, Field
 from .my_llm import llm1
 from langchain.agents import create_agent
@@ -13,6 +13,7 @@ from .prompts import (
     STUDY_PLANNER_AGENT_PROMPT
 )
 from .schemas import StudyRequest, StudyPlan, StudyPlanResponse
+from .warmup import StageCache, normalize_stage_key
 # 资源检索工具：示例用 DuckDuckGo（不需要 key）
 try:
     from langchain_community.tools import DuckDuckGoSearchRun
@@ -33,6 +34,14 @@ class MultiAgentStudyPlanner:
 
         self.resource_tools = []
 
+        # 诊断/资源阶段缓存：只在启用预热时打开，且只由预热写入通用结果
+        self.stage_cache: Optional[StageCache] = None
+
+    def enable_stage_cache(self, ttl_seconds: int, max_entries: int) -> None:
+        """启用诊断/资源阶段缓存（由预热调度器使用）"""
+        if self.stage_cache is None:
+            self.stage_cache = StageCache(ttl_seconds, max_entries)
+
     async def initialize(self):
         """初始化多智能体系统"""
         print("初始化多智能体学习规划系统...")
@@ -119,23 +128,16 @@ class MultiAgentStudyPlanner:
             print(f"每日时长: {request.daily_time_minutes} 分钟")
             print(f"{'='*60}\n")
 
-            # 1) 诊断
-            print("🧠 步骤1: 学情诊断...")
-            diagnosis_query = self._build_diagnosis_query(request)
-            diagnosis_resp = await self.diagnosis_agent.ainvoke(diagnosis_query)
-            diagnosis_text = self._extract_text(diagnosis_resp)
-            print(f"学情诊断结果: {diagnosis_text[:260]}...\n")
-
-            await asyncio.sleep(0.5)
-
-            # 2) 资源搜索
-            print("🔎 步骤2: 搜索学习资源...")
-            resource_query = self._build_resource_query(request, diagnosis_text)
-            resource_resp = await self.resource_agent.ainvoke(resource_query)
-            resource_text = self._extract_text(resource_resp)
-            print(f"资源搜索结果: {resource_text[:260]}...\n")
-
-            await asyncio.sleep(0.5)
+            # 1)+2) 诊断与资源搜索：启用预热时优先使用缓存的通用结果，个性化交给规划阶段
+            cached = None
+            if self.stage_cache is not None:
+                cached = self.stage_cache.get(normalize_stage_key(request))
+            generic_stages = cached is not None
+            if generic_stages:
+                diagnosis_text, resource_text = cached
+                print("⚡ 命中预热缓存，跳过学情诊断与资源搜索\n")
+            else:
+                diagnosis_text, resource_text, _ = await self._run_cacheable_stages(request)
 
             # 3) 时间规划
             print("⏳ 步骤3: 规划学习时间...")
@@ -148,7 +150,9 @@ class MultiAgentStudyPlanner:
 
             # 4) 输出JSON学习计划
             print("📋 步骤4: 生成学习规划(JSON)...")
-            planner_query = self._build_planner_query(request, diagnosis_text, resource_text, time_text)
+            planner_query = self._build_planner_query(
+                request, diagnosis_text, resource_text, time_text, generic_stages=generic_stages
+            )
             planner_input = {"messages": [("user", planner_query)]}
             # planner_resp = await self.planner_agent.ainvoke(planner_input)
             planner_resp = await self.planner_agent.ainvoke(planner_query)
@@ -168,15 +172,59 @@ class MultiAgentStudyPlanner:
             traceback.print_exc()
             raise
 
+    async def warm_stages(self, request: StudyRequest) -> int:
+        """
+        后台预热：只用 (subject, goal, current_level) 计算通用的诊断与资源结果并缓存，
+        不含任何个人偏好/约束/额外要求，返回消耗的 token 数
+        """
+        diagnosis_text, resource_text, tokens = await self._run_cacheable_stages(request, generic=True)
+        self.stage_cache.put(normalize_stage_key(request), diagnosis_text, resource_text)
+        return tokens
+
+    async def _run_cacheable_stages(self, request: StudyRequest, generic: bool = False) -> Tuple[str, str, int]:
+        """执行诊断与资源两个阶段，返回 (诊断文本, 资源文本, token 用量)；generic=True 时不带个人信息"""
+        # 1) 诊断
+        print("🧠 步骤1: 学情诊断...")
+        diagnosis_query = self._build_diagnosis_query(request, generic=generic)
+        diagnosis_resp = await self.diagnosis_agent.ainvoke(diagnosis_query)
+        diagnosis_text = self._extract_text(diagnosis_resp)
+        print(f"学情诊断结果: {diagnosis_text[:260]}...\n")
+
+        await asyncio.sleep(0.5)
+
+        # 2) 资源搜索
+        print("🔎 步骤2: 搜索学习资源...")
+        resource_query = self._build_resource_query(request, diagnosis_text, generic=generic)
+        resource_resp = await self.resource_agent.ainvoke(resource_query)
+        resource_text = self._extract_text(resource_resp)
+        print(f"资源搜索结果: {resource_text[:260]}...\n")
+
+        await asyncio.sleep(0.5)
+
+        tokens = self._extract_token_usage(diagnosis_resp) + self._extract_token_usage(resource_resp)
+        return diagnosis_text, resource_text, tokens
+
     # -------------------------
     # Query Builders
     # -------------------------
 
-    def _build_diagnosis_query(self, request: StudyRequest) -> dict:
+    def _build_diagnosis_query(self, request: StudyRequest, generic: bool = False) -> dict:
         preferences = "、".join(request.preferences) if request.preferences else "无"
         constraints = "、".join(request.constraints) if request.constraints else "无"
         extra = request.free_text_input or "无"
 
+        if generic:
+            # 通用诊断（预热缓存用）：只基于主题/目标/水平，个人时间与偏好由规划阶段处理
+            personal = "- 说明: 这是面向同类学习者的通用诊断，不涉及具体时间安排与个人偏好\n"
+        else:
+            personal = (
+                f"- 学习天数: {request.study_days}天\n"
+                f"- 每日可用时长: {request.daily_time_minutes}分钟\n"
+                f"- 偏好: {preferences}\n"
+                f"- 约束: {constraints}\n"
+                f"- 额外要求: {extra}\n"
+            )
+
         return {
             "messages": [
                 ("user",
@@ -185,12 +233,7 @@ class MultiAgentStudyPlanner:
 - 学习主题/科目: {request.subject}
 - 学习目标: {request.goal}
 - 自述当前水平: {request.current_level}
-- 学习天数: {request.study_days}天
-- 每日可用时长: {request.daily_time_minutes}分钟
-- 偏好: {preferences}
-- 约束: {constraints}
-- 额外要求: {extra}
-
+{personal}
 请输出：
 1) 当前水平判断（证据/依据写清楚，信息不足用“待确认”）
 2) 知识结构拆解（从基础到进阶）
@@ -201,8 +244,8 @@ class MultiAgentStudyPlanner:
             ]
         }
 
-    def _build_resource_query(self, request: StudyRequest, diagnosis_text: str) -> dict:
-        preferences = "、".join(request.preferences) if request.preferences else "无"
+    def _build_resource_query(self, request: StudyRequest, diagnosis_text: str, generic: bool = False) -> dict:
+        preferences = "、".join(request.preferences) if request.preferences and not generic else "无"
         return {
             "messages": [
                 ("user",
@@ -255,10 +298,19 @@ class MultiAgentStudyPlanner:
             ]
         }
 
-    def _build_planner_query(self, request: StudyRequest, diagnosis: str, resources: str, time_plan: str) -> dict:
+    def _build_planner_query(
+        self,
+        request: StudyRequest,
+        diagnosis: str,
+        resources: str,
+        time_plan: str,
+        generic_stages: bool = False,
+    ) -> dict:
         pref = ", ".join(request.preferences) if request.preferences else "无"
         cons = ", ".join(request.constraints) if request.constraints else "无"
         extra = request.free_text_input or "无"
+        # 诊断/资源来自预热缓存时是通用版，需要在这里结合基本信息个性化
+        generic_note = "（通用版，请结合上方基本信息中的时间、偏好、约束与额外要求进行个性化取舍）" if generic_stages else ""
         
         return {
             "messages":[
@@ -277,10 +329,10 @@ class MultiAgentStudyPlanner:
 - constraints: {cons}
 - extra: {extra}
 
-【学情诊断结果】
+【学情诊断结果】{generic_note}
 {diagnosis}
 
-【资源Agent结果（只能从这里挑资源链接，不要编造链接）】
+【资源Agent结果（只能从这里挑资源链接，不要编造链接）】{generic_note}
 {resources}
 
 【时间Agent结果】
@@ -508,6 +560,29 @@ class MultiAgentStudyPlanner:
             return str(response)[:800]
         return str(response)[:800]
 
+    def _extract_token_usage(self, response) -> int:
+        """统计 Agent 响应中各条消息的 token 用量；拿不到 usage 时按全部消息文本长度粗略估算"""
+        if not isinstance(response, dict):
+            return len(str(response)) // 2
+
+        messages = response.get("messages", []) or []
+        total = 0
+        for msg in messages:
+            usage = getattr(msg, "usage_metadata", None) or {}
+            total += int(usage.get("total_tokens", 0) or 0)
+        if total:
+            return total
+
+        # 兜底估算：每一轮模型调用都会重新读入之前的全部消息（含工具调用与工具结果）
+        context_chars = 0
+        for msg in messages:
+            chars = len(str(getattr(msg, "content", msg) or ""))
+            chars += len(str(getattr(msg, "tool_calls", None) or ""))
+            if getattr(msg, "type", "") == "ai":
+                total += context_chars + chars
+            context_chars += chars
+        return max(total, context_chars) // 2
+
 
 # =========================
 # 4) 单例/入口
@@ -0,0 +1,296 @@
+import asyncio
+import time
+from collections import Counter, OrderedDict, deque
+from datetime import datetime, date
+from typing import Deque, Dict, List, Optional, Tuple
+
+from .schemas import StudyRequest
+
+StageKey = Tuple[str, str, str]
+
+# 预热样本使用的固定天数/时长（通用诊断不会把它们写进提示词，仅用于构造合法请求）
+WARMUP_SAMPLE_DAYS = 14
+WARMUP_SAMPLE_MINUTES = 60
+
+# 频次表最多保留 top_n 的多少倍，超出后裁剪到 COUNTS_KEEP_FACTOR 倍
+COUNTS_MAX_FACTOR = 4
+COUNTS_KEEP_FACTOR = 2
+
+# 用最近多少次预热的平均 token 消耗来预估下一次
+RECENT_COST_WINDOW = 10
+
+# 预热失败时按最近平均消耗计费；还没有历史时按此估算
+FAILED_RUN_DEFAULT_COST = 5000
+# 连续失败的 key 按 interval * 2^(失败次数-1) 退避，最长不超过该值（秒）
+FAILURE_BACKOFF_MAX_SECONDS = 6 * 3600
+
+
+def normalize_stage_key(request: StudyRequest) -> StageKey:
+    """把 (subject, goal, current_level) 归一化为缓存/统计用的 key（去首尾空白、合并空白、小写）"""
+    def _norm(s: str) -> str:
+        return " ".join((s or "").split()).lower()
+
+    return _norm(request.subject), _norm(request.goal), _norm(request.current_level)
+
+
+def display_form(request: StudyRequest) -> StageKey:
+    """保留用户原始写法的 (subject, goal, current_level)，只去掉首尾空白，用于构造预热提示词"""
+    return (request.subject or "").strip(), (request.goal or "").strip(), (request.current_level or "").strip()
+
+
+def neutral_request(display: StageKey) -> StudyRequest:
+    """由主题三元组构造不含任何个人信息的预热样本"""
+    subject, goal, current_level = display
+    return StudyRequest(
+        subject=subject,
+        goal=goal,
+        current_level=current_level,
+        study_days=WARMUP_SAMPLE_DAYS,
+        daily_time_minutes=WARMUP_SAMPLE_MINUTES,
+    )
+
+
+def parse_windows(spec: str) -> List[Tuple[int, int]]:
+    """解析 "HH:MM-HH:MM,HH:MM-HH:MM" 为 [(起始分钟, 结束分钟)]，格式错误时抛出 ValueError"""
+    def _minute(hhmm: str, part: str) -> int:
+        try:
+            h, m = hhmm.strip().split(":")
+            h, m = int(h), int(m)
+        except ValueError:
+            raise ValueError(f"低峰时段格式错误: {part!r}，应为 HH:MM-HH:MM")
+        if not (0 <= h <= 24 and 0 <= m < 60 and h * 60 + m <= 24 * 60):
+            raise ValueError(f"低峰时段时间越界: {part!r}")
+        return h * 60 + m
+
+    windows = []
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" not in part:
+            raise ValueError(f"低峰时段格式错误: {part!r}，应为 HH:MM-HH:MM")
+        start, end = part.split("-", 1)
+        windows.append((_minute(start, part), _minute(end, part)))
+    return windows
+
+
+def in_windows(windows: List[Tuple[int, int]], now: Optional[datetime] = None) -> bool:
+    """当前时间是否落在任一低峰时段内（支持跨零点，如 23:00-02:00）"""
+    now = now or datetime.now()
+    minute = now.hour * 60 + now.minute
+    for start, end in windows:
+        if start <= end:
+            if start <= minute < end:
+                return True
+        elif minute >= start or minute < end:
+            return True
+    return False
+
+
+class StageCache:
+    """诊断/资源阶段结果缓存，按归一化 key 存储；超过 max_entries 时淘汰最久未使用的条目"""
+
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[StageKey, Tuple[float, str, str]]" = OrderedDict()
+
+    def get(self, key: StageKey) -> Optional[Tuple[str, str]]:
+        """返回未过期的 (diagnosis_text, resource_text)，否则 None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        ts, diagnosis_text, resource_text = entry
+        if time.time() - ts > self.ttl_seconds:
+            self._entries.pop(key, None)
+            return None
+        self._entries.move_to_end(key)
+        return diagnosis_text, resource_text
+
+    def put(self, key: StageKey, diagnosis_text: str, resource_text: str) -> None:
+        now = time.time()
+        for k in [k for k, (ts, _, _) in self._entries.items() if now - ts > self.ttl_seconds]:
+            del self._entries[k]
+        self._entries[key] = (now, diagnosis_text, resource_text)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def age(self, key: StageKey) -> Optional[float]:
+        entry = self._entries.get(key)
+        return None if entry is None else time.time() - entry[0]
+
+
+class WarmupScheduler:
+    """
+    热门主题后台预热调度器：
+    - 统计每个归一化 (subject, goal, current_level) 的请求频次
+    - 在低峰时段内定期为 Top-N key 预计算/刷新诊断与资源阶段结果
+    - 受每小时次数与每日 token 预算约束，有实时请求在处理时暂停预热
+    """
+
+    def __init__(
+        self,
+        planner,
+        top_n: int,
+        interval_seconds: int,
+        windows: str,
+        max_runs_per_hour: int,
+        daily_token_budget: int,
+    ):
+        self.planner = planner
+        self.top_n = top_n
+        self.interval_seconds = interval_seconds
+        self.windows = parse_windows(windows)
+        self.max_runs_per_hour = max_runs_per_hour
+        self.daily_token_budget = daily_token_budget
+
+        self._counts: Counter = Counter()
+        # 每个 key 首次出现时的原始写法（只含主题三字段，不含个人信息），用于预热提示词
+        self._display: Dict[StageKey, StageKey] = {}
+        self._run_times: Deque[float] = deque()
+        self._tokens_used = 0
+        self._recent_costs: Deque[int] = deque(maxlen=RECENT_COST_WINDOW)
+        self._failures: Dict[StageKey, Tuple[int, float]] = {}
+        self._budget_day: date = date.today()
+        self._live_requests = 0
+        self._task: Optional[asyncio.Task] = None
+
+    # -------------------------
+    # 实时请求钩子
+    # -------------------------
+
+    def record(self, request: StudyRequest) -> None:
+        """记录一次实时请求（只统计 key 频次与主题原始写法，不保留其他请求内容）"""
+        key = normalize_stage_key(request)
+        self._counts[key] += 1
+        self._display.setdefault(key, display_form(request))
+        # 长尾 key 不无限累积：只保留 top_n 加一定余量
+        if len(self._counts) > self.top_n * COUNTS_MAX_FACTOR:
+            self._counts = Counter(dict(self._counts.most_common(self.top_n * COUNTS_KEEP_FACTOR)))
+            self._display = {k: v for k, v in self._display.items() if k in self._counts}
+
+    def live_started(self) -> None:
+        self._live_requests += 1
+
+    def live_finished(self) -> None:
+        self._live_requests = max(0, self._live_requests - 1)
+
+    # -------------------------
+    # 生命周期
+    # -------------------------
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+            print(f"🔥 预热调度器已启动: top_n={self.top_n}, 间隔={self.interval_seconds}s, 时段={self.windows}")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ 预热失败: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    # -------------------------
+    # 预热逻辑
+    # -------------------------
+
+    def top_keys(self) -> List[StageKey]:
+        return [k for k, _ in self._counts.most_common(self.top_n)]
+
+    def _roll_budget(self) -> None:
+        """跨天时重置 token 预算，并对频次做衰减，避免旧热点长期霸榜"""
+        today = date.today()
+        if today != self._budget_day:
+            self._budget_day = today
+            self._tokens_used = 0
+            self._counts = Counter({k: c // 2 for k, c in self._counts.items() if c // 2 > 0})
+            self._failures = {k: v for k, v in self._failures.items() if k in self._counts}
+            self._display = {k: v for k, v in self._display.items() if k in self._counts}
+
+    def _can_run(self) -> bool:
+        now = time.time()
+        while self._run_times and now - self._run_times[0] > 3600:
+            self._run_times.popleft()
+        if len(self._run_times) >= self.max_runs_per_hour:
+            return False
+        remaining = self.daily_token_budget - self._tokens_used
+        if remaining <= 0:
+            return False
+        # 剩余预算不够一次平均消耗时不再启动，避免最后一次超支
+        if self._recent_costs and remaining < sum(self._recent_costs) / len(self._recent_costs):
+            return False
+        return self._live_requests == 0
+
+    def _avg_cost(self) -> int:
+        if not self._recent_costs:
+            return FAILED_RUN_DEFAULT_COST
+        return int(sum(self._recent_costs) / len(self._recent_costs))
+
+    def _in_backoff(self, key: StageKey) -> bool:
+        failure = self._failures.get(key)
+        return failure is not None and time.time() < failure[1]
+
+    def _record_failure(self, key: StageKey) -> int:
+        """记录一次失败：按平均消耗计入预算，并设置退避时间，返回本次计费的 token 数"""
+        count = self._failures.get(key, (0, 0.0))[0] + 1
+        delay = min(self.interval_seconds * 2 ** (count - 1), FAILURE_BACKOFF_MAX_SECONDS)
+        self._failures[key] = (count, time.time() + delay)
+        cost = self._avg_cost()
+        self._tokens_used += cost
+        return cost
+
+    def _needs_refresh(self, key: StageKey) -> bool:
+        """缓存不存在或已过半个 TTL 才刷新"""
+        age = self.planner.stage_cache.age(key)
+        return age is None or age > self.planner.stage_cache.ttl_seconds / 2
+
+    async def run_once(self) -> int:
+        """执行一轮预热，返回本轮预热的 key 数量"""
+        self._roll_budget()
+        if not self.windows or not in_windows(self.windows):
+            return 0
+
+        warmed = 0
+        for key in self.top_keys():
+            if self._in_backoff(key) or not self._needs_refresh(key):
+                continue
+            if not self._can_run():
+                break
+            if self.planner.diagnosis_agent is None:
+                await self.planner.initialize()
+
+            self._run_times.append(time.time())
+            try:
+                tokens = await self.planner.warm_stages(neutral_request(self._display.get(key, key)))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # 失败前可能已消耗 token（如诊断成功、资源阶段限流），按平均消耗计费后继续下一个 key
+                cost = self._record_failure(key)
+                print(f"⚠️ 预热失败: {self._display.get(key, key)[0]} | {e}（计费 {cost} token，第 {self._failures[key][0]} 次失败，暂缓重试）")
+                continue
+
+            self._failures.pop(key, None)
+            self._tokens_used += tokens
+            self._recent_costs.append(tokens)
+            warmed += 1
+            print(f"🔥 已预热: {self._display.get(key, key)[0]} | token {tokens}（今日累计 {self._tokens_used}/{self.daily_token_budget}）")
+
+            # 让出事件循环，避免与实时请求争抢
+            await asyncio.sleep(0)
+
+        return warmed